@@ -10,27 +10,103 @@ Formato do Pacote:
 - Checksum (1 byte): XOR de todos os bytes anteriores
 """
 
+import functools
+import operator
 import struct
 
 MAGIC_NUMBER = 0xCAFE
 MAX_PAYLOAD_SIZE = 1024 # Limite artificial para simular restrições
+_MAGIC_HI, _MAGIC_LO = MAGIC_NUMBER >> 8, MAGIC_NUMBER & 0xFF
+_MAGIC_XOR = _MAGIC_HI ^ _MAGIC_LO # Contribuição do magic (já validado) ao checksum
+# Bitmask dos tipos válidos: 0x01 (DATA), 0x02 (CMD), 0x03 (ACK)
+_VALID_TYPES_MASK = (1 << 0x01) | (1 << 0x02) | (1 << 0x03)
+_SWAR_MIN_LEN = 16 # Abaixo disso o custo fixo do int.from_bytes não compensa
+
+def _fold_steps(bits):
+    """Sequência (shift, máscara) que dobra um inteiro de 8 * 2**bits bits em 1 byte."""
+    return tuple((8 << i, (1 << (8 << i)) - 1) for i in reversed(range(bits)))
+
+# Tabela indexada por (len - 1).bit_length(), cobrindo payloads de até MAX_PAYLOAD_SIZE
+_FOLD_TABLE = tuple(_fold_steps(bits) for bits in range((MAX_PAYLOAD_SIZE - 1).bit_length() + 1))
+
+# Mensagens de erro por código; só são formatadas se a exceção for exibida
+_MESSAGES = {
+    "SHORT_HEADER": "Dados insuficientes para cabeçalho: {} bytes",
+    "MAGIC": "Magic number inválido: {:#04x}",
+    "TYPE": "Tipo de pacote desconhecido: {:#02x}",
+    "TOO_BIG": "Payload excede o tamanho máximo: {} > {}",
+    "SHORT_PAYLOAD": "Dados insuficientes para payload e checksum. Esperado: {}, Recebido: {}",
+    "CHECKSUM": "Checksum inválido. Esperado: {:#02x}, Recebido: {:#02x}",
+    "CMD_SHORT": "Tamanho de pacote insuficiente",
+}
 
 class ParsingError(Exception):
-    """Exceção customizada para erros de parsing."""
-    pass
+    """Exceção customizada para erros de parsing (mensagem montada só em __str__)."""
+
+    @property
+    def code(self):
+        code = self.args[0] if self.args else None
+        return code if isinstance(code, str) and code in _MESSAGES else None
+
+    def __str__(self):
+        fmt = _MESSAGES.get(self.code)
+        # Mensagem livre, ou argumentos que não batem com o modelo do código
+        if fmt is None or fmt.count("{") != len(self.args) - 1:
+            return super().__str__()
+        try:
+            return fmt.format(*self.args[1:])
+        except (ValueError, TypeError):
+            return super().__str__()
 
 def calculate_checksum(data_bytes):
     """Calcula um checksum XOR simples."""
-    checksum = 0
-    for byte in data_bytes:
-        checksum ^= byte
-    return checksum
+    n = len(data_bytes)
+    if n < _SWAR_MIN_LEN:
+        # A redução acontece em C, sem despachar bytecode a cada byte
+        return functools.reduce(operator.xor, data_bytes, 0)
+
+    # SWAR: interpreta o buffer como um inteiro e dobra as metades com XOR
+    # (associativo) até sobrar um único byte -- O(log n) operações em C.
+    value = int.from_bytes(data_bytes, "little")
+    bits = (n - 1).bit_length()
+    steps = _FOLD_TABLE[bits] if bits < len(_FOLD_TABLE) else _fold_steps(bits)
+    for shift, mask in steps:
+        value = (value >> shift) ^ (value & mask)
+    return value
+
+def _finalize_plain(packet_type, payload_len, payload, checksum):
+    """Monta o resultado de DATA e ACK (sem campos extras)."""
+    # Só agora, com o pacote aceito, o payload é copiado para bytes
+    return {
+        "magic": MAGIC_NUMBER,
+        "type": packet_type,
+        "payload_len": payload_len,
+        "payload": payload.tobytes(),
+        "checksum": checksum
+    }
+
+def _finalize_cmd(packet_type, payload_len, payload, checksum):
+    """Valida o payload de CMD e monta o resultado com o código do comando."""
+    # --- Vulnerabilidade Potencial 5: Lógica falha baseada no tipo --- 
+    # Supõe que o payload de CMD sempre tem pelo menos 1 byte para o código do comando
+    # Se payload_len for 0, isso causará um IndexError!
+    if payload_len == 0 or len(payload) < 1:
+        raise ParsingError("CMD_SHORT")
+
+    result = _finalize_plain(packet_type, payload_len, payload, checksum)
+    result["command_code"] = payload[0]
+    # Poderia haver mais lógica aqui que falha com payload vazio ou malformado
+    return result
 
-def parse_packet(data: bytes):
+# Finalizadores indexados pelo tipo do pacote: 0x01 (DATA), 0x02 (CMD), 0x03 (ACK)
+_FINALIZERS = (None, _finalize_plain, _finalize_cmd, _finalize_plain)
+
+def parse_packet(data: bytes | bytearray | memoryview):
     """Faz o parsing de um pacote binário.
 
     Args:
-        data: Os bytes brutos do pacote.
+        data: Os bytes brutos do pacote (qualquer objeto com buffer protocol:
+            bytes, bytearray ou memoryview, contíguo ou não).
 
     Returns:
         Um dicionário com os campos do pacote parseado.
@@ -38,82 +114,88 @@ def parse_packet(data: bytes):
     Raises:
         ParsingError: Se ocorrer um erro durante o parsing.
         IndexError: Se os dados forem insuficientes (pode ser explorado por fuzzing).
-        struct.error: Se os dados não puderem ser desempacotados (pode ser explorado).
+        TypeError: Se a entrada não suportar o buffer protocol.
     """
-    if not isinstance(data, bytes):
-        raise TypeError("Entrada deve ser bytes")
-
-    # --- Vulnerabilidade Potencial 1: Verificação de tamanho insuficiente --- 
-    # Faltava verificar se há bytes suficientes para o cabeçalho completo + checksum
-    # if len(data) < 6: # Mínimo para cabeçalho (2+1+2) + checksum (1)
-    #     raise ParsingError(f"Dados insuficientes para cabeçalho e checksum: {len(data)} bytes")
-    # Correção parcial (ainda vulnerável se o payload_len for grande):
-    if len(data) < 5: # Mínimo para cabeçalho (2+1+2)
-         raise ParsingError(f"Dados insuficientes para cabeçalho: {len(data)} bytes")
-
-    # 1. Verificar Magic Number
-    magic = struct.unpack(">H", data[0:2])[0] # Big Endian Short
-    if magic != MAGIC_NUMBER:
-        raise ParsingError(f"Magic number inválido: {magic:#04x}")
-
-    # 2. Obter Tipo do Pacote
-    packet_type = data[2]
-    if packet_type not in [0x01, 0x02, 0x03]:
-        raise ParsingError(f"Tipo de pacote desconhecido: {packet_type:#02x}")
-
-    # 3. Obter Comprimento do Payload
-    payload_len = struct.unpack(">H", data[3:5])[0] # Big Endian Short
-
-    # --- Vulnerabilidade Potencial 2: Verificação de limite inadequada --- 
-    # Permitir payload_len > MAX_PAYLOAD_SIZE pode levar a problemas
-    # if payload_len > MAX_PAYLOAD_SIZE:
-    #     raise ParsingError(f"Payload excede o tamanho máximo: {payload_len} > {MAX_PAYLOAD_SIZE}")
-    # Bug intencional: A verificação está comentada!
-
-    # 4. Verificar tamanho total esperado vs. tamanho real
-    expected_total_len = 2 + 1 + 2 + payload_len + 1 # Cabeçalho + Payload + Checksum
-    if len(data) < expected_total_len:
-         # --- Vulnerabilidade Potencial 3: Mensagem de erro pode vazar informação --- 
-         # A mensagem revela o tamanho esperado, o que pode ser útil para um atacante.
-         raise ParsingError(f"Dados insuficientes para payload e checksum. Esperado: {expected_total_len}, Recebido: {len(data)}")
-
-    # 5. Extrair Payload
-    payload_start = 5
-    payload_end = payload_start + payload_len
-    payload = data[payload_start:payload_end]
-
-    # --- Vulnerabilidade Potencial 4: Off-by-one na leitura? --- 
-    # Se payload_end for calculado incorretamente, pode ler fora dos limites.
-    # Neste caso, o slice do Python protege, mas a lógica poderia estar errada.
-
-    # 6. Verificar Checksum
-    expected_checksum = calculate_checksum(data[:payload_end])
-    actual_checksum = data[payload_end] # O byte *após* o payload
-
-    if expected_checksum != actual_checksum:
-        raise ParsingError(f"Checksum inválido. Esperado: {expected_checksum:#02x}, Recebido: {actual_checksum:#02x}")
-
-    # 7. Lógica específica do tipo (Bug intencional)
-    result = {
-        "magic": magic,
-        "type": packet_type,
-        "payload_len": payload_len,
-        "payload": payload,
-        "checksum": actual_checksum
-    }
-
-    # --- Vulnerabilidade Potencial 5: Lógica falha baseada no tipo --- 
-    if packet_type == 0x02: # CMD
-        # Supõe que o payload de CMD sempre tem pelo menos 1 byte para o código do comando
-        # Se payload_len for 0, isso causará um IndexError!
-        if payload_len == 0 or len(payload) < 1:
-            raise ParsingError("Tamanho de pacote insuficiente")
-
-        command_code = payload[0]
-        result["command_code"] = command_code
-        # Poderia haver mais lógica aqui que falha com payload vazio ou malformado
-
-    return result
+    # Uma única view de bytes sobre a entrada: fatiar uma memoryview não copia
+    # nada. memoryview() já levanta TypeError para objetos que não são buffers.
+    mv = memoryview(data)
+    if not mv.c_contiguous:
+        # cast() exige buffer contíguo; só esse caso raro paga uma cópia
+        mv = memoryview(mv.tobytes())
+    if mv.format != "B" or mv.ndim != 1:
+        mv = mv.cast("B")
+
+    payload = None
+    try:
+        # 1. Verificar Magic Number
+        # Vem antes de tudo: em entradas aleatórias é a rejeição mais comum, e
+        # comparar dois bytes dispensa a chamada ao struct.
+        if len(mv) < 2:
+            raise ParsingError("SHORT_HEADER", len(mv))
+        if mv[0] != _MAGIC_HI or mv[1] != _MAGIC_LO:
+            raise ParsingError("MAGIC", (mv[0] << 8) | mv[1])
+
+        # --- Vulnerabilidade Potencial 1: Verificação de tamanho insuficiente --- 
+        # Faltava verificar se há bytes suficientes para o cabeçalho completo + checksum
+        # if len(mv) < 6: # Mínimo para cabeçalho (2+1+2) + checksum (1)
+        #     raise ParsingError(f"Dados insuficientes para cabeçalho e checksum: {len(mv)} bytes")
+        # Correção parcial (ainda vulnerável se o payload_len for grande):
+        if len(mv) < 5: # Mínimo para cabeçalho (2+1+2)
+             raise ParsingError("SHORT_HEADER", len(mv))
+
+        # 2. Obter Tipo do Pacote
+        packet_type = mv[2]
+        if not (1 << packet_type) & _VALID_TYPES_MASK:
+            raise ParsingError("TYPE", packet_type)
+
+        # 3. Obter Comprimento do Payload (Big Endian), direto dos bytes: sem
+        # chamada ao struct nem tupla intermediária
+        payload_len = (mv[3] << 8) | mv[4]
+
+        # --- Limite do payload (antiga Vulnerabilidade Potencial 2, corrigida) ---
+        # Antes a verificação ficava comentada e payload_len > MAX_PAYLOAD_SIZE era
+        # aceito. Verificado logo após ler o comprimento: limita todo o trabalho seguinte
+        # (slice e checksum) a no máximo MAX_PAYLOAD_SIZE bytes.
+        if payload_len > MAX_PAYLOAD_SIZE:
+            raise ParsingError("TOO_BIG", payload_len, MAX_PAYLOAD_SIZE)
+
+        # 4. Verificar tamanho total esperado vs. tamanho real
+        expected_total_len = 2 + 1 + 2 + payload_len + 1 # Cabeçalho + Payload + Checksum
+        if len(mv) < expected_total_len:
+             # --- Vulnerabilidade Potencial 3: Mensagem de erro pode vazar informação --- 
+             # A mensagem revela o tamanho esperado, o que pode ser útil para um atacante.
+             raise ParsingError("SHORT_PAYLOAD", expected_total_len, len(mv))
+
+        payload_start = 5
+        payload_end = payload_start + payload_len
+
+        # --- Vulnerabilidade Potencial 4: Off-by-one na leitura? --- 
+        # Se payload_end for calculado incorretamente, pode ler fora dos limites.
+        # Neste caso, o slice do Python protege, mas a lógica poderia estar errada.
+
+        # 5. Extrair Payload
+        payload = mv[payload_start:payload_end]
+
+        # 6. Verificar Checksum
+        # Os bytes do cabeçalho já foram lidos: sua parte do XOR vem dos campos
+        # decodificados e só a view do payload é percorrida.
+        expected_checksum = (_MAGIC_XOR ^ packet_type ^ (payload_len >> 8) ^ (payload_len & 0xFF)
+                             ^ calculate_checksum(payload))
+        actual_checksum = mv[payload_end] # O byte *após* o payload
+
+        if expected_checksum != actual_checksum:
+            raise ParsingError("CHECKSUM", expected_checksum, actual_checksum)
+
+        # 7. Lógica específica do tipo (Bug intencional)
+        # packet_type já foi validado: uma única chamada pela tabela valida e monta
+        # o resultado, sem if por tipo
+        return _FINALIZERS[packet_type](packet_type, payload_len, payload, actual_checksum)
+    finally:
+        # Libera o export do buffer do chamador mesmo que a exceção (e o
+        # traceback, que guarda estas views) sobreviva à chamada
+        if payload is not None:
+            payload.release()
+        mv.release()
 
 # Exemplo de uso (não faz parte do fuzzing target diretamente)
 if __name__ == "__main__":